@@ -14,12 +14,21 @@ def get_encryption_key() -> bytes:
     return key_str.encode()
 
 
+# Singleton Fernet instance; the key is static for the process lifetime
+_fernet: Fernet | None = None
+
+
+def _get_fernet() -> Fernet:
+    """Get or create singleton Fernet instance"""
+    global _fernet
+    if _fernet is None:
+        _fernet = Fernet(get_encryption_key())
+    return _fernet
+
+
 def decrypt_string(encrypted: str) -> str | None:
     """Decrypt a Fernet-encrypted string"""
     if not encrypted:
         return None
 
-    key = get_encryption_key()
-    f = Fernet(key)
-    decrypted_bytes = f.decrypt(encrypted.encode())
-    return decrypted_bytes.decode()
+    return _get_fernet().decrypt(encrypted.encode()).decode()
@@ -3,72 +3,73 @@ Environment variable loader with fallback to .envrc file
 """
 
 import os
+import re
 import logging
+from functools import lru_cache
 from pathlib import Path
 from typing import Optional, Dict
 
 logger = logging.getLogger(__name__)
 
+# None until .envrc has been loaded; an empty dict means nothing was found
 _env_cache: Optional[Dict[str, str]] = None
 
 
-def _load_envrc_file() -> Dict[str, str]:
-    """Load environment variables from .envrc file"""
-    env_vars = {}
-    
+_ENVRC_LINE = re.compile(r'^\s*(?:export\s+)?([A-Za-z_][A-Za-z0-9_]*)\s*=\s*(.*?)\s*$')
+
+
+@lru_cache(maxsize=1)
+def _find_envrc_file() -> Optional[Path]:
+    """Locate the .envrc file (resolved once per process)"""
+    # Explicit path skips the directory search entirely
+    override = os.getenv("GRYT_ENVRC_PATH")
+    if override:
+        path = Path(override)
+        return path if path.exists() else None
+
     current_dir = Path.cwd()
-    envrc_path = current_dir / ".envrc"
-    
-    # Try parent directories
-    if not envrc_path.exists():
-        for parent in current_dir.parents:
-            candidate = parent / ".envrc"
-            if candidate.exists():
-                envrc_path = candidate
-                break
-    
+
+    # Current directory, then parent directories
+    for directory in (current_dir, *current_dir.parents):
+        candidate = directory / ".envrc"
+        if candidate.exists():
+            return candidate
+
     # Check common installation paths
-    if not envrc_path.exists():
-        common_paths = [
-            Path("/opt/gryt-ci-agent/.envrc"),
-            Path.home() / "gryt-ci-agent" / ".envrc",
-        ]
-        for path in common_paths:
-            if path.exists():
-                envrc_path = path
-                break
-    
-    if not envrc_path.exists():
+    common_paths = [
+        Path("/opt/gryt-ci-agent/.envrc"),
+        Path.home() / "gryt-ci-agent" / ".envrc",
+    ]
+    for path in common_paths:
+        if path.exists():
+            return path
+
+    return None
+
+
+def _unquote(value: str) -> str:
+    """Strip matching surrounding quotes from a value"""
+    if len(value) >= 2 and value[0] in ('"', "'") and value[-1] == value[0]:
+        return value[1:-1]
+    return value
+
+
+def _load_envrc_file() -> Dict[str, str]:
+    """Load environment variables from .envrc file"""
+    envrc_path = _find_envrc_file()
+    if envrc_path is None:
         logger.warning("No .envrc file found")
-        return env_vars
-    
+        return {}
+
     logger.info(f"Loading environment variables from {envrc_path}")
-    
+
     try:
-        with open(envrc_path, 'r') as f:
-            for line in f:
-                line = line.strip()
-                
-                if not line or line.startswith('#'):
-                    continue
-                
-                if line.startswith('export '):
-                    line = line[7:]
-                
-                if '=' in line:
-                    key, value = line.split('=', 1)
-                    key = key.strip()
-                    value = value.strip()
-                    
-                    if value and value[0] in ('"', "'") and value[-1] == value[0]:
-                        value = value[1:-1]
-                    
-                    env_vars[key] = value
-    
+        matches = [_ENVRC_LINE.match(line) for line in envrc_path.read_text().splitlines()]
     except Exception as e:
         logger.error(f"Error reading .envrc file: {e}")
-    
-    return env_vars
+        return {}
+
+    return {m.group(1): _unquote(m.group(2)) for m in matches if m}
 
 
 def get_env(key: str, default: Optional[str] = None, required: bool = False) -> Optional[str]:
@@ -5,24 +5,39 @@ Executes jobs in isolated Docker containers
 """
 
 import os
-import base64
+import stat
 import tempfile
 import shutil
 import logging
 import json
+import time
+import hashlib
+import threading
+import subprocess
 from pathlib import Path
 from typing import Optional, Dict, Any
-from datetime import datetime
+from datetime import datetime, timezone
 
 import docker
-from docker.errors import DockerException, ImageNotFound, ContainerError
-from git import Repo
-from git.exc import GitCommandError
+from docker.errors import DockerException, ImageNotFound
 
 from agent.crypto import decrypt_string
 
+try:
+    # SIMD-accelerated decoder; falls back to the stdlib when unavailable
+    import pybase64 as _b64
+except ImportError:
+    import base64 as _b64
+
 logger = logging.getLogger(__name__)
 
+# Container output is buffered in memory up to this size, then spills to disk
+_LOG_SPOOL_SIZE = 1 << 20
+# Only the last _MAX_OUTPUT_BYTES of container output are returned to the caller
+_MAX_OUTPUT_BYTES = 1 << 20
+# HTTP connections kept open to the Docker daemon (docker-py defaults to 10)
+_DOCKER_POOL_SIZE = 64
+
 
 def _clean_json_output(output: str) -> str:
     """
@@ -30,45 +45,94 @@ def _clean_json_output(output: str) -> str:
     If output is valid JSON, return it compactly formatted.
     Otherwise, return the original output.
     """
+    stripped = output.strip()
+    # Cheap check so plain-text logs are never run through the JSON parser
+    if stripped[:1] not in ('{', '['):
+        return output
+
     try:
-        parsed = json.loads(output.strip())
+        # stdlib json keeps integers of any size exact (orjson does not)
+        parsed = json.loads(stripped)
         return json.dumps(parsed, separators=(',', ':'))
     except (json.JSONDecodeError, ValueError):
         # Not JSON, return as-is
         return output
 
 
+def decode_pipeline(pipeline_b64: str) -> bytes:
+    """Decode a base64-encoded gryt pipeline"""
+    return _b64.b64decode(pipeline_b64)
+
+
+def _read_tail(log_file, max_bytes: int) -> str:
+    """Read the last max_bytes of a log file as text"""
+    size = log_file.tell()
+    log_file.seek(max(0, size - max_bytes))
+    return log_file.read().decode('utf-8', errors='replace')
+
+
+def _redact(text: str, secret: Optional[str]) -> str:
+    """Remove a secret (e.g. a token embedded in a git URL) from text"""
+    return text.replace(secret, "***") if secret else text
+
+
+def _run_git(args: list[str], timeout: int = 600) -> subprocess.CompletedProcess:
+    """Run a git command non-interactively"""
+    return subprocess.run(
+        ["git", *args],
+        check=True,
+        capture_output=True,
+        timeout=timeout,
+        # Fail fast instead of waiting for credentials on a TTY
+        env={**os.environ, "GIT_TERMINAL_PROMPT": "0"}
+    )
+
+
+def _utc_timestamp() -> str:
+    """Current UTC time as a naive ISO-8601 string"""
+    return datetime.now(timezone.utc).replace(tzinfo=None).isoformat()
+
+
+def _force_remove(func, path, exc):
+    """
+    shutil.rmtree onexc handler that fixes permissions only where needed.
+    Docker may leave entries without owner write/read bits, so on a
+    PermissionError we grant owner rwx and retry just the failed operation.
+    """
+    if isinstance(exc, FileNotFoundError):
+        # Already removed by a nested retry below
+        return
+    if not isinstance(exc, PermissionError):
+        raise exc
+
+    if func in (os.open, os.scandir):
+        # Directory could not be listed: make it readable and remove it
+        os.chmod(path, stat.S_IRWXU)
+        shutil.rmtree(path, onexc=_force_remove)
+    else:
+        # Entry could not be unlinked: its parent directory needs write access
+        os.chmod(os.path.dirname(path), stat.S_IRWXU)
+        func(path)
+
+
 def _fix_permissions_recursive(path: Path):
     """
     Fix permissions recursively on a directory to allow deletion.
-    Docker creates files as root, so we need to chmod them before deletion.
+    Docker creates files as root, which the agent user cannot chmod itself,
+    so this is only used as a fallback when the in-process removal fails.
     """
-    import subprocess
     try:
-        # Use chmod to recursively fix permissions
-        result = subprocess.run(
-            ['chmod', '-R', 'u+rwX', str(path)],
+        # In production, the agent should have proper permissions
+        subprocess.run(
+            ['sudo', '-n', 'chmod', '-R', 'u+rwX', str(path)],
             check=True,
             capture_output=True,
             timeout=30
         )
-        logger.debug(f"Fixed permissions on {path}")
-    except (subprocess.CalledProcessError, subprocess.TimeoutExpired, FileNotFoundError) as e:
-        # If chmod fails, try with sudo (for local testing)
-        # In production, the agent should have proper permissions
-        logger.warning(f"chmod failed, trying with sudo: {e}")
-        try:
-            result = subprocess.run(
-                ['sudo', '-n', 'chmod', '-R', 'u+rwX', str(path)],
-                check=True,
-                capture_output=True,
-                timeout=30
-            )
-            logger.debug(f"Fixed permissions on {path} with sudo")
-        except Exception as e2:
-            # Last resort: ignore permission errors
-            logger.warning(f"Failed to fix permissions even with sudo: {e2}")
-            pass
+        logger.debug(f"Fixed permissions on {path} with sudo")
+    except Exception as e:
+        # Last resort: ignore permission errors
+        logger.warning(f"Failed to fix permissions even with sudo: {e}")
 
 
 class JobExecutionError(Exception):
@@ -83,7 +147,8 @@ class DockerJobExecutor:
         self,
         docker_client: Optional[docker.DockerClient] = None,
         workspace_dir: str = "/tmp/gryt-agent-jobs",
-        default_image: str = "ghcr.io/epyklab/gryt/pipeline:latest"
+        default_image: str = "ghcr.io/epyklab/gryt/pipeline:latest",
+        repo_cache: bool = False
     ):
         """
         Initialize Docker job executor
@@ -92,11 +157,17 @@ class DockerJobExecutor:
             docker_client: Docker client (if None, will create one)
             workspace_dir: Base directory for job workspaces
             default_image: Default Docker image for jobs
+            repo_cache: Keep a shared bare clone per repository and use it
+                as a --reference for job clones
         """
-        self.docker_client = docker_client or docker.from_env()
+        self.docker_client = docker_client or docker.from_env(max_pool_size=_DOCKER_POOL_SIZE)
         self.workspace_dir = Path(workspace_dir)
         self.workspace_dir.mkdir(parents=True, exist_ok=True)
         self.default_image = default_image
+        self.repo_cache = repo_cache
+        self._repo_cache_locks: Dict[str, threading.Lock] = {}
+        # Images already confirmed present, so repeat jobs skip the daemon lookup
+        self._known_images: set[str] = set()
 
         # Verify Docker is accessible
         try:
@@ -108,21 +179,22 @@ class DockerJobExecutor:
     def execute_job(
         self,
         job_id: int,
-        pipeline_b64: str,
+        pipeline_bytes: bytes,
         git_url: Optional[str] = None,
         git_branch: Optional[str] = "main",
         github_token_encrypted: Optional[str] = None,
         docker_image: Optional[str] = None,
         env_vars: Optional[Dict[str, str]] = None,
         cpu_limit: Optional[str] = None,
-        memory_limit: Optional[str] = None
+        memory_limit: Optional[str] = None,
+        max_log_lines: Optional[int] = None
     ) -> Dict[str, Any]:
         """
         Execute a job in a Docker container
 
         Args:
             job_id: Unique job ID
-            pipeline_b64: Base64-encoded gryt pipeline
+            pipeline_bytes: Decoded gryt pipeline source (see decode_pipeline)
             git_url: Optional Git repository URL
             git_branch: Branch to clone
             github_token_encrypted: Encrypted GitHub token
@@ -130,13 +202,15 @@ class DockerJobExecutor:
             env_vars: Environment variables to pass to container
             cpu_limit: CPU limit (e.g., "1.0" for 1 CPU)
             memory_limit: Memory limit (e.g., "512m")
+            max_log_lines: Only return the last N lines of container output
 
         Returns:
             Dict with execution results
         """
         workspace = None
         container = None
-        start_time = datetime.utcnow()
+        started_at = _utc_timestamp()
+        start = time.perf_counter()
 
         try:
             # Create workspace
@@ -154,7 +228,7 @@ class DockerJobExecutor:
                 logger.info(f"[Job {job_id}] Cloned repository")
 
             # Write pipeline file
-            self._write_pipeline_file(workspace, pipeline_b64)
+            self._write_pipeline_file(workspace, pipeline_bytes)
             logger.info(f"[Job {job_id}] Wrote pipeline file")
 
             # Pull Docker image
@@ -168,11 +242,11 @@ class DockerJobExecutor:
                 image=image,
                 env_vars=env_vars or {},
                 cpu_limit=cpu_limit,
-                memory_limit=memory_limit
+                memory_limit=memory_limit,
+                max_log_lines=max_log_lines
             )
 
-            end_time = datetime.utcnow()
-            duration = (end_time - start_time).total_seconds()
+            duration = time.perf_counter() - start
 
             logger.info(
                 f"[Job {job_id}] Completed in {duration:.2f}s. "
@@ -180,15 +254,14 @@ class DockerJobExecutor:
             )
 
             result["duration_seconds"] = duration
-            result["started_at"] = start_time.isoformat()
-            result["completed_at"] = end_time.isoformat()
+            result["started_at"] = started_at
+            result["completed_at"] = _utc_timestamp()
 
             return result
 
         except Exception as e:
             logger.error(f"[Job {job_id}] Execution failed: {e}")
-            end_time = datetime.utcnow()
-            duration = (end_time - start_time).total_seconds()
+            duration = time.perf_counter() - start
 
             return {
                 "success": False,
@@ -196,8 +269,8 @@ class DockerJobExecutor:
                 "stdout": "",
                 "stderr": str(e),
                 "duration_seconds": duration,
-                "started_at": start_time.isoformat(),
-                "completed_at": end_time.isoformat(),
+                "started_at": started_at,
+                "completed_at": _utc_timestamp(),
                 "error": str(e)
             }
 
@@ -205,16 +278,19 @@ class DockerJobExecutor:
             # Cleanup
             if workspace and workspace.exists():
                 try:
-                    # Fix permissions before deletion (Docker creates files as root)
-                    _fix_permissions_recursive(workspace)
-                    shutil.rmtree(workspace)
+                    try:
+                        shutil.rmtree(workspace, onexc=_force_remove)
+                    except OSError:
+                        # Root-owned files from the container need elevated chmod
+                        _fix_permissions_recursive(workspace)
+                        shutil.rmtree(workspace)
                     logger.info(f"[Job {job_id}] Cleaned up workspace")
                 except Exception as e:
                     logger.warning(f"[Job {job_id}] Failed to cleanup workspace: {e}")
 
     def _create_workspace(self, job_id: int) -> Path:
         """Create temporary workspace for job"""
-        workspace = self.workspace_dir / f"job-{job_id}-{datetime.utcnow().timestamp()}"
+        workspace = self.workspace_dir / f"job-{job_id}-{time.monotonic_ns()}-{os.getpid()}"
         workspace.mkdir(parents=True, exist_ok=True)
         return workspace
 
@@ -226,8 +302,13 @@ class DockerJobExecutor:
         github_token_encrypted: Optional[str]
     ):
         """Clone Git repository into workspace"""
+        # A leading "-" would be parsed as a git option (e.g. --upload-pack)
+        if git_url.startswith("-"):
+            raise JobExecutionError(f"Invalid git URL: {git_url}")
+
         # Decrypt token if provided
         git_url_with_auth = git_url
+        token = None
         if github_token_encrypted:
             try:
                 token = decrypt_string(github_token_encrypted)
@@ -239,33 +320,77 @@ class DockerJobExecutor:
         repo_path = workspace / "repo"
         logger.info(f"Cloning {git_url} (branch: {branch}) to {repo_path}")
         
+        command = ["clone", "--depth=1", "--single-branch"]
+        if branch:
+            command += ["--branch", branch]
+            if self.repo_cache:
+                reference = self._update_repo_cache(git_url, git_url_with_auth, branch, token)
+                if reference:
+                    # Borrow objects from the cache, then copy them so the
+                    # workspace doesn't depend on a path outside the container mount
+                    command += ["--reference-if-able", str(reference), "--dissociate"]
+        # "--" so git never parses the URL or path as options
+        command += ["--", git_url_with_auth, str(repo_path)]
+
         try:
-            repo = Repo.clone_from(
-                url=git_url_with_auth,
-                to_path=str(repo_path),
-                branch=branch,
-                depth=1
-            )
+            _run_git(command)
             
             # Verify clone was successful
             if not repo_path.exists() or not (repo_path / ".git").exists():
                 raise JobExecutionError(f"Clone completed but repository directory is invalid")
             
-            # Count files to verify content
-            file_count = len(list(repo_path.rglob("*")))
-            logger.info(f"Successfully cloned repository with {file_count} files/directories")
+            # Count top-level entries to verify content (non-recursive)
+            with os.scandir(repo_path) as entries:
+                entry_count = sum(1 for _ in entries)
+            logger.info(f"Successfully cloned repository with {entry_count} top-level entries")
             
-        except GitCommandError as e:
-            raise JobExecutionError(f"Failed to clone repository (GitCommandError): {e}")
+        except subprocess.CalledProcessError as e:
+            stderr = e.stderr.decode('utf-8', errors='replace').strip()
+            raise JobExecutionError(
+                f"Failed to clone repository (git exit code {e.returncode}): "
+                f"{_redact(stderr, token)}"
+            )
+        except subprocess.TimeoutExpired:
+            raise JobExecutionError("Timed out cloning repository after 600s")
         except Exception as e:
-            logger.error(f"Unexpected error during clone: {type(e).__name__}: {e}")
-            raise JobExecutionError(f"Failed to clone repository: {e}")
+            message = _redact(str(e), token)
+            logger.error(f"Unexpected error during clone: {type(e).__name__}: {message}")
+            raise JobExecutionError(f"Failed to clone repository: {message}")
 
-    def _write_pipeline_file(self, workspace: Path, pipeline_b64: str):
+    def _update_repo_cache(
+        self,
+        git_url: str,
+        git_url_with_auth: str,
+        branch: str,
+        token: Optional[str]
+    ) -> Optional[Path]:
+        """
+        Fetch branch into the shared bare clone for git_url.
+        Returns the cache path, or None if it could not be updated.
+        """
+        digest = hashlib.sha256(git_url.encode()).hexdigest()[:16]
+        cache_path = self.workspace_dir / "_cache" / f"{digest}.git"
+        lock = self._repo_cache_locks.setdefault(str(cache_path), threading.Lock())
+
+        with lock:
+            try:
+                if not cache_path.exists():
+                    _run_git(["init", "--bare", "--quiet", str(cache_path)])
+                # Full (non-shallow) fetch: git refuses shallow repos as references.
+                # Fetch by URL so the token is never written to the cache config
+                _run_git([
+                    "-C", str(cache_path), "fetch", "--quiet", "--",
+                    git_url_with_auth, f"+refs/heads/{branch}:refs/heads/{branch}"
+                ])
+                return cache_path
+            except (subprocess.SubprocessError, OSError) as e:
+                # e.g. git exit/timeout, git missing, or _cache not writable
+                logger.warning(f"Failed to update repository cache: {_redact(str(e), token)}")
+                return None
+
+    def _write_pipeline_file(self, workspace: Path, pipeline_bytes: bytes):
         """Write decoded pipeline to workspace"""
         try:
-            pipeline_content = base64.b64decode(pipeline_b64).decode('utf-8')
-
             # If repo was cloned, write to repo dir, otherwise workspace root
             repo_dir = workspace / "repo"
             target_dir = repo_dir if repo_dir.exists() else workspace
@@ -275,12 +400,15 @@ class DockerJobExecutor:
 
             # Write pipeline as Python file (gryt expects .py files)
             pipeline_file = target_dir / "pipeline.py"
-            pipeline_file.write_text(pipeline_content)
+            pipeline_file.write_bytes(pipeline_bytes)
         except Exception as e:
             raise JobExecutionError(f"Failed to write pipeline file: {e}")
 
     def _ensure_image(self, image: str):
         """Ensure Docker image is available (pull if needed)"""
+        if image in self._known_images:
+            return
+
         try:
             self.docker_client.images.get(image)
             logger.info(f"Image {image} already exists")
@@ -292,6 +420,9 @@ class DockerJobExecutor:
             except DockerException as e:
                 raise JobExecutionError(f"Failed to pull image {image}: {e}")
 
+        # containers.run() still pulls on its own if the image is removed later
+        self._known_images.add(image)
+
     def _run_in_container(
         self,
         job_id: int,
@@ -299,7 +430,8 @@ class DockerJobExecutor:
         image: str,
         env_vars: Dict[str, str],
         cpu_limit: Optional[str],
-        memory_limit: Optional[str]
+        memory_limit: Optional[str],
+        max_log_lines: Optional[int] = None
     ) -> Dict[str, Any]:
         """Execute gryt in Docker container"""
 
@@ -327,48 +459,74 @@ class DockerJobExecutor:
         if memory_limit:
             host_config_kwargs["mem_limit"] = memory_limit
 
+        container = None
         try:
-            # Run container
+            # Start container and stream its output to a spooled buffer so
+            # memory use stays bounded regardless of how much it prints
             container = self.docker_client.containers.run(
                 image=image,
                 command=command,
                 volumes=volumes,
                 environment=environment,
                 working_dir="/workspace",
-                detach=False,
-                remove=True,
-                stdout=True,
-                stderr=True,
+                detach=True,
                 **host_config_kwargs
             )
 
-            # Container ran successfully
-            output = container.decode('utf-8') if isinstance(container, bytes) else str(container)
-            # Clean up JSON output if applicable
-            clean_output = _clean_json_output(output)
+            if max_log_lines is not None:
+                # Let the daemon do the tailing so only the last N lines
+                # ever cross the Docker socket
+                exit_code = container.wait()["StatusCode"]
+                logs = container.logs(stdout=True, stderr=True, tail=max_log_lines)
 
-            return {
-                "success": True,
-                "exit_code": 0,
-                "stdout": clean_output,
-                "stderr": ""
-            }
+                if len(logs) > _MAX_OUTPUT_BYTES:
+                    logger.warning(
+                        f"[Job {job_id}] Output truncated to last {_MAX_OUTPUT_BYTES} bytes"
+                    )
+                    logs = logs[-_MAX_OUTPUT_BYTES:]
+                output = logs.decode('utf-8', errors='replace')
 
-        except ContainerError as e:
-            # Container exited with non-zero exit code
-            logger.warning(f"[Job {job_id}] Container exited with code {e.exit_status}")
+            else:
+                with tempfile.SpooledTemporaryFile(max_size=_LOG_SPOOL_SIZE) as log_file:
+                    for chunk in container.logs(stream=True, follow=True, stdout=True, stderr=True):
+                        log_file.write(chunk)
+
+                    exit_code = container.wait()["StatusCode"]
 
-            stdout = e.stderr.decode('utf-8') if e.stderr else ""
+                    if log_file.tell() > _MAX_OUTPUT_BYTES:
+                        logger.warning(
+                            f"[Job {job_id}] Output truncated to last {_MAX_OUTPUT_BYTES} bytes"
+                        )
+                    output = _read_tail(log_file, _MAX_OUTPUT_BYTES)
+
+        except DockerException as e:
+            raise JobExecutionError(f"Docker execution failed: {e}")
+
+        finally:
+            if container is not None:
+                try:
+                    container.remove(force=True)
+                except DockerException as e:
+                    logger.warning(f"[Job {job_id}] Failed to remove container: {e}")
+
+        if exit_code != 0:
+            # Container exited with non-zero exit code
+            logger.warning(f"[Job {job_id}] Container exited with code {exit_code}")
 
             return {
                 "success": False,
-                "exit_code": e.exit_status,
-                "stdout": stdout,
-                "stderr": stdout
+                "exit_code": exit_code,
+                "stdout": output,
+                "stderr": output
             }
 
-        except DockerException as e:
-            raise JobExecutionError(f"Docker execution failed: {e}")
+        return {
+            "success": True,
+            "exit_code": 0,
+            # Clean up JSON output if applicable
+            "stdout": _clean_json_output(output),
+            "stderr": ""
+        }
 
 
 # Singleton executor
@@ -380,5 +538,9 @@ def get_executor() -> DockerJobExecutor:
     global _executor
     if _executor is None:
         default_image = os.getenv("GRYT_DOCKER_IMAGE", "ghcr.io/epyklab/gryt/pipeline:latest")
-        _executor = DockerJobExecutor(default_image=default_image)
+        _executor = DockerJobExecutor(
+            workspace_dir=os.getenv("GRYT_WORKSPACE_DIR", "/tmp/gryt-agent-jobs"),
+            default_image=default_image,
+            repo_cache=os.getenv("GRYT_REPO_CACHE", "").lower() in ("1", "true", "yes")
+        )
     return _executor
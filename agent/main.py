@@ -5,14 +5,19 @@ Receives job execution requests from main API and runs them in Docker
 """
 
 import os
+import hmac
+import asyncio
 import logging
+from functools import partial
 from typing import Optional, Dict, Any
 from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
 
 from fastapi import FastAPI, HTTPException, Header, status
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PrivateAttr, ValidationError, model_validator
+from pydantic_core import InitErrorDetails, PydanticCustomError
 
-from agent.executor import get_executor, JobExecutionError
+from agent.executor import get_executor, decode_pipeline, JobExecutionError
 from agent.env_loader import get_env
 
 # Configure logging
@@ -22,6 +27,13 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Dedicated pool for long-running jobs, so they can never exhaust the
+# loop's default executor that short calls like the health ping use
+_job_pool = ThreadPoolExecutor(
+    max_workers=int(os.getenv("AGENT_MAX_JOBS", str(os.cpu_count() or 1))),
+    thread_name_prefix="gryt-job"
+)
+
 
 # ============================================================================
 # Request/Response Models
@@ -38,8 +50,34 @@ class JobExecutionRequest(BaseModel):
     env_vars: Optional[Dict[str, str]] = Field(None, description="Environment variables")
     cpu_limit: Optional[str] = Field(None, description="CPU limit (e.g., '1.0')")
     memory_limit: Optional[str] = Field(None, description="Memory limit (e.g., '512m')")
+    max_log_lines: Optional[int] = Field(None, ge=1, description="Only return the last N lines of output")
     callback_url: Optional[str] = Field(None, description="URL to POST results to")
 
+    _pipeline_bytes: bytes = PrivateAttr(b"")
+
+    @model_validator(mode="after")
+    def _decode_pipeline(self) -> "JobExecutionRequest":
+        """Decode the pipeline once while the request is validated"""
+        try:
+            self._pipeline_bytes = decode_pipeline(self.pipeline_b64)
+        except ValueError as e:
+            # binascii.Error for bad padding, plain ValueError for non-ASCII input
+            # Report against pipeline_b64 only; a plain ValueError here would
+            # echo the whole body (tokens, env vars, payload) in the 422
+            raise ValidationError.from_exception_data(self.__class__.__name__, [
+                InitErrorDetails(
+                    type=PydanticCustomError("base64_decode", "Invalid base64: {reason}", {"reason": str(e)}),
+                    loc=("pipeline_b64",),
+                    input=None
+                )
+            ])
+        return self
+
+    @property
+    def pipeline_bytes(self) -> bytes:
+        """Decoded gryt pipeline source"""
+        return self._pipeline_bytes
+
 
 class JobExecutionResponse(BaseModel):
     """Response from job execution"""
@@ -89,6 +127,7 @@ async def lifespan(app: FastAPI):
 
     # Shutdown
     logger.info("Shutting down Gryt CI Agent...")
+    _job_pool.shutdown(wait=False, cancel_futures=True)
 
 
 # ============================================================================
@@ -107,18 +146,21 @@ app = FastAPI(
 # Authentication
 # ============================================================================
 
+# Read once at startup; the key does not change for the process lifetime
+_EXPECTED_API_KEY = (get_env("AGENT_API_KEY") or "").encode()
+
+
 def verify_api_key(x_api_key: str = Header(..., alias="X-API-Key")) -> str:
     """Verify API key from header"""
-    expected_key = get_env("AGENT_API_KEY")
-
-    if not expected_key:
+    if not _EXPECTED_API_KEY:
         logger.error("AGENT_API_KEY not configured")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Agent not configured properly"
         )
 
-    if x_api_key != expected_key:
+    # Constant-time comparison to avoid leaking the key through timing
+    if not hmac.compare_digest(x_api_key.encode(), _EXPECTED_API_KEY):
         logger.warning("Invalid API key provided")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -149,7 +191,7 @@ async def health():
 
     try:
         executor = get_executor()
-        executor.docker_client.ping()
+        await asyncio.to_thread(executor.docker_client.ping)
         docker_available = True
     except Exception as e:
         logger.warning(f"Docker health check failed: {e}")
@@ -180,18 +222,21 @@ async def execute_job(
         # Get executor
         executor = get_executor()
 
-        # Execute job
-        result = executor.execute_job(
+        # Execute job on the job pool so blocking Docker/git calls
+        # don't stall the event loop for other requests
+        result = await asyncio.get_running_loop().run_in_executor(_job_pool, partial(
+            executor.execute_job,
             job_id=request.job_id,
-            pipeline_b64=request.pipeline_b64,
+            pipeline_bytes=request.pipeline_bytes,
             git_url=request.git_url,
             git_branch=request.git_branch,
             github_token_encrypted=request.github_token_encrypted,
             docker_image=request.docker_image,
             env_vars=request.env_vars,
             cpu_limit=request.cpu_limit,
-            memory_limit=request.memory_limit
-        )
+            memory_limit=request.memory_limit,
+            max_log_lines=request.max_log_lines
+        ))
 
         # TODO: If callback_url is provided, POST results to it
         if request.callback_url:
@@ -228,10 +273,12 @@ if __name__ == "__main__":
 
     port = int(os.getenv("AGENT_PORT", "8080"))
     host = os.getenv("AGENT_HOST", "0.0.0.0")
+    workers = int(os.getenv("AGENT_WORKERS", "1"))
 
     uvicorn.run(
         "agent.main:app",
         host=host,
         port=port,
+        workers=workers,
         log_level="info"
     )
@@ -0,0 +1,31 @@
+"""
+Tests for request validation in the FastAPI service
+"""
+
+import pytest
+from fastapi.testclient import TestClient
+
+from agent.main import app
+
+
+@pytest.mark.parametrize("pipeline_b64", ["abc", "été"])
+def test_invalid_pipeline_b64_error_does_not_echo_request(pipeline_b64):
+    """Base64 decode errors are scoped to pipeline_b64 and hide the input"""
+    client = TestClient(app)
+
+    response = client.post(
+        "/jobs/execute",
+        headers={"X-API-Key": "irrelevant"},
+        json={
+            "job_id": 1,
+            "pipeline_b64": pipeline_b64,
+            "github_token_encrypted": "SECRET-TOKEN",
+            "env_vars": {"PASSWORD": "SECRET-ENV"},
+        },
+    )
+
+    assert response.status_code == 422
+    errors = response.json()["detail"]
+    assert [error["loc"] for error in errors] == [["body", "pipeline_b64"]]
+    assert errors[0]["input"] is None
+    assert "SECRET" not in response.text